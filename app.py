@@ -9,6 +9,12 @@ This app lets you **query and analyze developer-focused tools** (e.g., Firebase
 Enter your use case or tool category below, and get an automated comparison.
 """)
 
+@st.cache_resource
+def get_workflow() -> Workflow:
+    """One Workflow (LLM client, Firecrawl session, caches, compiled graph) for every rerun"""
+    return Workflow()
+
+
 query = st.text_input("Enter your query (e.g. Firebase alternatives, best auth providers):")
 
 if st.button("🔎 Run Analysis"):
@@ -25,8 +31,12 @@ if st.button("🔎 Run Analysis"):
         # Progress bar
         progress_bar = st.progress(0)
         
-    # Create workflow instance
-    workflow = Workflow()
+    # Results sections are laid out up front so the recommendation can stream in place
+    summary_container = st.container()
+    recommendation_container = st.container()
+
+    # Reuse the cached workflow instance
+    workflow = get_workflow()
     
     # Run workflow with progress updates
     with st.spinner("Running workflow, please wait..."):
@@ -34,12 +44,15 @@ if st.button("🔎 Run Analysis"):
         step1_placeholder.info("🔍 Step 1: Finding articles and extracting tools...")
         progress_bar.progress(20)
         
-        result = workflow.run(query, progress_callback={
-            'step1': step1_placeholder,
-            'step2': step2_placeholder, 
-            'step3': step3_placeholder,
-            'progress_bar': progress_bar
-        })
+        with recommendation_container:
+            st.subheader("🧠 Final Recommendation")
+            st.write_stream(workflow.run_streaming(query, progress_callback={
+                'step1': step1_placeholder,
+                'step2': step2_placeholder, 
+                'step3': step3_placeholder,
+                'progress_bar': progress_bar
+            }))
+        result = workflow.last_result
         
         progress_bar.progress(100)
         step3_placeholder.success("✅ Analysis complete!")
@@ -48,27 +61,28 @@ if st.button("🔎 Run Analysis"):
     progress_container.empty()
     
     # Display results
-    st.subheader("📊 Research Summary")
-
-    num_tools = len(result.companies)
-    num_open_source = sum(1 for c in result.companies if c.is_open_source)
-    num_with_apis = sum(1 for c in result.companies if c.api_available)
-    num_free = sum(1 for c in result.companies if c.pricing_model in ["Free", "Freemium"])
+    with summary_container:
+        st.subheader("📊 Research Summary")
 
-    col1, col2, col3, col4 = st.columns(4)
-    col1.metric("Tools Found", num_tools)
-    col2.metric("Open Source", num_open_source)
-    col3.metric("With APIs", num_with_apis)
-    col4.metric("Free/Freemium", num_free)
+        # Single pass over the companies for all four metrics
+        num_tools = num_open_source = num_with_apis = num_free = 0
+        free_pricing = {"Free", "Freemium"}
+        for c in result["companies"]:
+            num_tools += 1
+            num_open_source += c.is_open_source is True
+            num_with_apis += c.api_available is True
+            num_free += c.pricing_model in free_pricing
 
-    # Recommendation above
-    st.subheader("🧠 Final Recommendation")
-    st.markdown(result.analysis)
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("Tools Found", num_tools)
+        col2.metric("Open Source", num_open_source)
+        col3.metric("With APIs", num_with_apis)
+        col4.metric("Free/Freemium", num_free)
 
     # Detailed analysis
     st.subheader("📋 Detailed Tool Analysis")
-    if result.companies:
-        for company in result.companies:
+    if result["companies"]:
+        for company in result["companies"]:
             with st.expander(company.name):
                 st.markdown(f"**Website:** [{company.website}]({company.website})")
                 st.markdown(f"**Description:** {company.description}")
@@ -1,37 +1,245 @@
+import asyncio
+import hashlib
 import os
-from firecrawl import FirecrawlApp,ScrapeOptions
+import pickle
+import threading
+from typing import Any, Dict, Optional
+from urllib.parse import urlsplit, urlunsplit
+import aiohttp
+from cachetools import TTLCache
+from firecrawl import AsyncFirecrawlApp,ScrapeOptions
+from firecrawl.firecrawl import SearchResponse
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# Scraped pages and search hits for popular tools barely change between queries
+CACHE_TTL = 3600
+CACHE_MAXSIZE = 1024
+# Keep-alive pool shared by all concurrent requests of a run
+MAX_CONNECTIONS = 50
+MAX_CONNECTIONS_PER_HOST = 20
+# Socket-level limits only: Firecrawl enforces its own 60 s timeout per search/scrape, so the
+# read limit leaves room for its result (or timeout error) to arrive instead of cutting it off
+CONNECT_TIMEOUT = 30
+READ_TIMEOUT = 90
+
+
+def normalize_url(url: str) -> str:
+    """Lowercase scheme/host and drop the trailing slash and fragment, for comparing URLs"""
+    parts = urlsplit(url.strip())
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path.rstrip("/"), parts.query, ""))
+
+
+class PooledAsyncFirecrawlApp(AsyncFirecrawlApp):
+    """AsyncFirecrawlApp that reuses one aiohttp session instead of opening one per request"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._session_loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        # Sessions are tied to the event loop they were created on
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._session_loop is not loop:
+            self._session_loop = loop
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=MAX_CONNECTIONS, limit_per_host=MAX_CONNECTIONS_PER_HOST),
+                timeout=aiohttp.ClientTimeout(total=None, sock_connect=CONNECT_TIMEOUT, sock_read=READ_TIMEOUT)
+            )
+        return self._session
+
+    async def aclose(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        self._session_loop = None
+
+    async def _async_request(
+            self,
+            method: str,
+            url: str,
+            headers: Dict[str, str],
+            data: Optional[Dict[str, Any]] = None,
+            retries: int = 3,
+            backoff_factor: float = 0.5) -> Dict[str, Any]:
+        # Mirrors the private AsyncFirecrawlApp._async_request of firecrawl-py 2.x (pinned <3 for
+        # that reason), keeping its retry behaviour but going through the shared session
+        session = self._get_session()
+        for attempt in range(retries):
+            try:
+                async with session.request(
+                    method=method, url=url, headers=headers, json=data
+                ) as response:
+                    if response.status == 502:
+                        await asyncio.sleep(backoff_factor * (2 ** attempt))
+                        continue
+                    if response.status >= 300:
+                        await self._handle_error(response, f"make {method} request")
+                    return await response.json()
+            except aiohttp.ClientError as e:
+                if attempt == retries - 1:
+                    raise e
+                await asyncio.sleep(backoff_factor * (2 ** attempt))
+        raise Exception("Max retries exceeded")
+
+
 class FirecrawlService:
     def __init__(self):
         api_key = os.getenv("FIRECRAWL_API_KEY")
         if not api_key:
             raise ValueError("Missing FIRECRAWL_API_KEY environment variable")
-        self.app = FirecrawlApp(api_key=api_key)
+        self.async_app = PooledAsyncFirecrawlApp(api_key=api_key)
+        self._search_cache = TTLCache(maxsize=CACHE_MAXSIZE, ttl=CACHE_TTL)
+        self._scrape_cache = TTLCache(maxsize=CACHE_MAXSIZE, ttl=CACHE_TTL)
+        self._cache_lock = threading.Lock()
+        self._redis = self._connect_redis()
+
+    async def aclose(self):
+        """Release the pooled HTTP connections used by the async methods"""
+        await self.async_app.aclose()
+
+    @staticmethod
+    def _connect_redis():
+        """Optional shared cache tier, enabled by setting REDIS_URL"""
+        redis_url = os.getenv("REDIS_URL")
+        if not redis_url:
+            return None
+        try:
+            import redis
+            return redis.Redis.from_url(redis_url)
+        except ImportError:
+            print("redis is not installed, using in-process Firecrawl cache only")
+            return None
+
+    @staticmethod
+    def _cache_key(*parts) -> str:
+        return hashlib.sha256(repr(parts).encode()).hexdigest()
 
-    def search_companies(self,query:str,num_results:int=5):
+    def _redis_get(self, namespace: str, key: str):
         try:
-            result = self.app.search(
+            raw = self._redis.get(f"firecrawl:{namespace}:{key}")
+        except Exception as e:
+            print(e)
+            return None
+        return None if raw is None else pickle.loads(raw)
+
+    def _redis_set(self, namespace: str, key: str, value):
+        try:
+            self._redis.setex(f"firecrawl:{namespace}:{key}", CACHE_TTL, pickle.dumps(value))
+        except Exception as e:
+            print(e)
+
+    # The blocking Redis client runs in a worker thread to keep the event loop free
+    async def _acache_get(self, cache: TTLCache, namespace: str, key: str):
+        with self._cache_lock:
+            value = cache.get(key)
+        if value is not None or self._redis is None:
+            return value
+        value = await asyncio.to_thread(self._redis_get, namespace, key)
+        if value is None:
+            return None
+        with self._cache_lock:
+            return cache.setdefault(key, value)
+
+    async def _acache_set(self, cache: TTLCache, namespace: str, key: str, value):
+        with self._cache_lock:
+            cache[key] = value
+        if self._redis is not None:
+            await asyncio.to_thread(self._redis_set, namespace, key, value)
+
+    @staticmethod
+    def _search_scrape_options(scrape: bool, formats: list[str] = None):
+        if not scrape:
+            return None
+        return ScrapeOptions(formats=formats or ["markdown"], onlyMainContent=True)
+
+    @staticmethod
+    def _align_batch_results(urls: list[str], documents: list) -> list:
+        """Map batch scrape documents back onto the requested URL order"""
+        by_url = {}
+        for doc in documents:
+            source = (doc.metadata or {}).get("sourceURL") or doc.url
+            if source:
+                by_url.setdefault(normalize_url(source), doc)
+        if not by_url and len(documents) == len(urls):
+            # Nothing identifies the documents, so trust the job's ordering
+            return list(documents)
+        aligned, used = [], set()
+        for url in urls:
+            doc = by_url.get(normalize_url(url))
+            # A document never answers for two different URLs
+            if doc is not None and id(doc) not in used:
+                used.add(id(doc))
+                aligned.append(doc)
+            else:
+                aligned.append(None)
+        return aligned
+
+    async def _acached_pages(self, urls: list[str], bypass_cache: bool) -> dict:
+        if bypass_cache:
+            return {}
+        cached = await asyncio.gather(*(
+            self._acache_get(self._scrape_cache, "scrape", self._cache_key(url)) for url in urls
+        ))
+        return {url: page for url, page in zip(urls, cached) if page is not None}
+
+    async def _astore_pages(self, urls: list[str], documents: list, pages: dict):
+        aligned = [
+            (url, doc) for url, doc in zip(urls, self._align_batch_results(urls, documents)) if doc is not None
+        ]
+        await asyncio.gather(*(
+            self._acache_set(self._scrape_cache, "scrape", self._cache_key(url), doc) for url, doc in aligned
+        ))
+        pages.update(aligned)
+
+    async def asearch_companies(self, query: str, num_results: int = 5, scrape: bool = False, formats: list[str] = None, bypass_cache: bool = False):
+        """Search the web; with scrape=True each hit comes back with its page content inline"""
+        key = self._cache_key(query, num_results, scrape, formats)
+        if not bypass_cache and (cached := await self._acache_get(self._search_cache, "search", key)) is not None:
+            return cached
+        try:
+            result = await self.async_app.search(
                 query=f"{query} company pricing",
                 limit=num_results,
-                scrape_options=ScrapeOptions(
-                    formats=["markdown"]
-                )
+                scrape_options=self._search_scrape_options(scrape, formats)
             )
-            return result
+            # The async client hands back the raw JSON payload
+            response = SearchResponse(**result)
+            await self._acache_set(self._search_cache, "search", key, response)
+            return response
         except Exception as e:
             print(e)
-            return []
-    def scrape_company_pages(self, url: str):
+            return SearchResponse(success=False, data=[], error=str(e))
+
+    async def ascrape_company_pages(self, url: str, bypass_cache: bool = False):
+        key = self._cache_key(url)
+        if not bypass_cache and (cached := await self._acache_get(self._scrape_cache, "scrape", key)) is not None:
+            return cached
         try:
-            result = self.app.scrape_url(
+            result = await self.async_app.scrape_url(
                 url,
-                formats=["markdown"]
+                formats=["markdown"],
+                only_main_content=True
             )
+            await self._acache_set(self._scrape_cache, "scrape", key, result)
             return result
         except Exception as e:
             print(e)
             return None
-            
\ No newline at end of file
+
+    async def abatch_scrape(self, urls: list[str], bypass_cache: bool = False):
+        pages = await self._acached_pages(urls, bypass_cache)
+        missing = [url for url in dict.fromkeys(urls) if url not in pages]
+        if missing:
+            try:
+                result = await self.async_app.batch_scrape_urls(
+                    missing,
+                    formats=["markdown"],
+                    only_main_content=True
+                )
+                await self._astore_pages(missing, result.data, pages)
+            except Exception as e:
+                print(e)
+        return [pages.get(url) for url in urls]
@@ -1,4 +1,5 @@
-from typing import List, Optional, Dict, Any
+from operator import add
+from typing import Annotated, List, Optional, TypedDict
 from pydantic import BaseModel
 
 
@@ -13,6 +14,16 @@ class CompanyAnalysis(BaseModel):
     integration_capabilities: List[str] = []
 
 
+class NamedCompanyAnalysis(CompanyAnalysis):
+    """One entry of a batch analysis, tagged with the tool it describes"""
+    name: str
+
+
+class CompanyAnalysisBatch(BaseModel):
+    """Structured output for analyzing several tools in a single LLM call"""
+    analyses: List[NamedCompanyAnalysis] = []  # Matched back to the tools by name
+
+
 class CompanyInfo(BaseModel):
     name: str
     description: str
@@ -28,9 +39,11 @@ class CompanyInfo(BaseModel):
     developer_experience_rating: Optional[str] = None  # Poor, Good, Excellent
 
 
-class ResearchState(BaseModel):
+class ResearchState(TypedDict, total=False):
+    """Graph state; a plain dict so LangGraph merges node updates without revalidating models"""
     query: str
-    extracted_tools: List[str] = []  # Tools extracted from articles
-    companies: List[CompanyInfo] = []
-    search_results: List[Dict[str, Any]] = []
-    analysis: Optional[str] = None
\ No newline at end of file
+    extracted_tools: Annotated[List[str], add]  # Tools extracted from articles
+    scraped_corpus: str  # Article content gathered while extracting tools
+    companies: Annotated[List[CompanyInfo], add]
+    analysis: Optional[str]
+    failed_steps: Annotated[List[str], add]  # Nodes that fell back to placeholder results
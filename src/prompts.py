@@ -1,3 +1,5 @@
+from typing import List, Tuple
+
 
 class DeveloperToolsPrompts:
     """Collection of prompts for analyzing developer tools and technologies"""
@@ -33,11 +35,18 @@ class DeveloperToolsPrompts:
                             Pay special attention to programming languages, frameworks, APIs, SDKs, and development workflows."""
 
     @staticmethod
-    def tool_analysis_user(company_name: str, content: str) -> str:
-        return f"""Company/Tool: {company_name}
-                Website Content: {content[:2500]}
+    def tool_analysis_batch_user(tools: List[Tuple[str, str]]) -> str:
+        tool_blocks = "\n\n".join(
+            f"### Tool {i}: {company_name}\n{content}"
+            for i, (company_name, content) in enumerate(tools, start=1)
+        )
+        return f"""Website content for {len(tools)} developer tools follows, one block per tool:
+
+                {tool_blocks}
 
-                Analyze this content from a developer's perspective and provide:
+                Analyze each tool from a developer's perspective. Return exactly {len(tools)} analyses in "analyses",
+                in the same order as the tool blocks above, each providing:
+                - name: The tool name exactly as written in its block heading
                 - pricing_model: One of "Free", "Freemium", "Paid", "Enterprise", or "Unknown"
                 - is_open_source: true if open source, false if proprietary, null if unclear
                 - tech_stack: List of programming languages, frameworks, databases, APIs, or technologies supported/used
@@ -46,7 +55,7 @@ class DeveloperToolsPrompts:
                 - language_support: List of programming languages explicitly supported (e.g., Python, JavaScript, Go, etc.)
                 - integration_capabilities: List of tools/platforms it integrates with (e.g., GitHub, VS Code, Docker, AWS, etc.)
 
-                Focus on developer-relevant features like APIs, SDKs, language support, integrations, and development workflows."""
+                Only use the content of a tool's own block when analyzing it."""
 
     # Recommendation prompts
     RECOMMENDATIONS_SYSTEM = """You are a senior software engineer providing quick, concise tech recommendations. 
@@ -1,180 +1,535 @@
-from typing import Dict, Any, Optional
+import asyncio
+import concurrent.futures
+import json
+import os
+import queue
+import re
+import threading
+import weakref
+from typing import Dict, Any, ClassVar, Iterator, List, Optional, Tuple
 from langgraph.graph import StateGraph, END
+from langgraph.graph.state import CompiledStateGraph
+from langgraph.cache.base import BaseCache
+from langgraph.cache.memory import InMemoryCache
+from langgraph.types import CachePolicy
 from langchain_google_genai import ChatGoogleGenerativeAI  
 from langchain_core.messages import HumanMessage, SystemMessage
-from .models import ResearchState, CompanyInfo, CompanyAnalysis
-from .firecrawl import FirecrawlService
+from langchain_core.runnables import RunnableConfig
+from .models import ResearchState, CompanyInfo, CompanyAnalysis, CompanyAnalysisBatch
+from .firecrawl import FirecrawlService, normalize_url
 from .prompts import DeveloperToolsPrompts
 
+# Node outputs are deterministic (temperature=0) for a given input, so repeat queries can skip the work
+NODE_CACHE_TTL = 3600
+# Tools analyzed per LLM call; larger batches save round-trips but crowd the context window
+ANALYSIS_BATCH_SIZE = 4
+# Per-source character budgets for scraped markdown sent to the LLM
+ARTICLE_CONTENT_CHARS = 1500
+ANALYSIS_CONTENT_CHARS = 2500
+# Markdown link targets cost tokens without helping the analysis
+MARKDOWN_LINK_TARGET = re.compile(r"\]\([^)]+\)")
+# Comparison articles usually bold the product names they list
+BOLD_TOOL_NAME = re.compile(r"\*\*([A-Z][\w.-]+)\*\*")
+
+
+def _compact_markdown(markdown: str, max_chars: int) -> str:
+    """Drop link URLs (keeping the link text) and cap the length"""
+    return MARKDOWN_LINK_TARGET.sub("]", markdown)[:max_chars]
+
+
+def _bold_tool_names(corpus: str) -> List[str]:
+    """Cheap fallback when the LLM extracted nothing: bolded names from the articles, in order"""
+    return list(dict.fromkeys(BOLD_TOOL_NAME.findall(corpus)))
+
+
+def _unique_names(names: List[str]) -> List[str]:
+    """Drop names repeated up to case and surrounding whitespace, keeping the first spelling"""
+    unique = {}
+    for name in names:
+        unique.setdefault(name.strip().casefold(), name.strip())
+    return list(unique.values())
+
+
+class SuccessOnlyCache(BaseCache):
+    """Node cache that skips results written alongside ``failed_steps``, so fallbacks get retried"""
+
+    def __init__(self, inner: BaseCache):
+        super().__init__(serde=inner.serde)
+        self.inner = inner
+
+    @staticmethod
+    def _successful(pairs):
+        return {
+            key: (writes, ttl)
+            for key, (writes, ttl) in pairs.items()
+            if not any(channel == "failed_steps" and value for channel, value in writes)
+        }
+
+    def get(self, keys):
+        return self.inner.get(keys)
+
+    async def aget(self, keys):
+        return await self.inner.aget(keys)
+
+    def set(self, pairs):
+        self.inner.set(self._successful(pairs))
+
+    async def aset(self, pairs):
+        await self.inner.aset(self._successful(pairs))
+
+    def clear(self, namespaces=None):
+        self.inner.clear(namespaces)
+
+    async def aclear(self, namespaces=None):
+        await self.inner.aclear(namespaces)
+
+
+def _build_node_cache() -> BaseCache:
+    """In-memory node cache, or a SQLite-backed one when LANGGRAPH_CACHE_DB is set"""
+    cache_path = os.getenv("LANGGRAPH_CACHE_DB")
+    if cache_path:
+        try:
+            from langgraph.cache.sqlite import SqliteCache
+            return SuccessOnlyCache(SqliteCache(path=cache_path))
+        except ImportError:
+            print("langgraph-checkpoint-sqlite is not installed, using in-memory node cache")
+    return SuccessOnlyCache(InMemoryCache())
+
+
+class RunContext:
+    """Per-run state, handed to the nodes through ``config["configurable"]["run"]``"""
+
+    def __init__(self):
+        # Progress updates and recommendation tokens, replayed on the caller's thread
+        self.events: queue.Queue = queue.Queue()
+        # Normalized URL -> markdown for pages already fetched during this run
+        self.scrape_cache: Dict[str, str] = {}
+
+
+def _run_loop(loop: asyncio.AbstractEventLoop):
+    asyncio.set_event_loop(loop)
+    try:
+        loop.run_forever()
+    finally:
+        loop.close()
+
+
+def _shutdown_loop(loop: asyncio.AbstractEventLoop, firecrawl: FirecrawlService):
+    """Close the pooled Firecrawl session on ``loop``, then stop it; safe to call from any thread"""
+    future = asyncio.run_coroutine_threadsafe(firecrawl.aclose(), loop)
+    future.add_done_callback(lambda _: loop.call_soon_threadsafe(loop.stop))
+    return future
+
+
+def _workflow_node(step_name: str):
+    """Graph node that runs ``step_name`` on the Workflow and RunContext passed in the run config"""
+    async def node(state: ResearchState, config: RunnableConfig) -> Dict[str, Any]:
+        configurable = config["configurable"]
+        return await getattr(configurable["workflow"], step_name)(state, configurable["run"])
+
+    # Node cache entries are namespaced by the callable's qualified name
+    node.__name__ = step_name
+    node.__qualname__ = f"Workflow.{step_name}"
+    return node
+
+
 class Workflow:
+    # The topology never changes, so the graph is compiled once and shared by all instances
+    _compiled_graph: ClassVar[Optional[CompiledStateGraph]] = None
+
     def __init__(self):
         self.firecrawl = FirecrawlService()
         self.llm = ChatGoogleGenerativeAI(model="gemini-2.5-pro", temperature=0)
         self.prompts = DeveloperToolsPrompts()
-        self.workflow = self._build_workflow()
-        self.progress_callback = None
+        # System prompts and the structured-output runnable never change, so build them once
+        self._extract_sys = SystemMessage(content=self.prompts.TOOL_EXTRACTION_SYSTEM)
+        self._analyze_sys = SystemMessage(content=self.prompts.TOOL_ANALYSIS_SYSTEM)
+        self._recommend_sys = SystemMessage(content=self.prompts.RECOMMENDATIONS_SYSTEM)
+        self._analysis_llm = self.llm.with_structured_output(CompanyAnalysisBatch)
+        if Workflow._compiled_graph is None:
+            Workflow._compiled_graph = self._build_workflow()
+        self.workflow = Workflow._compiled_graph
+        # Every run executes on one loop, started by the first run, so the LLM's async client
+        # and the pooled Firecrawl session stay bound to a loop that outlives the run
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_lock = threading.Lock()
+        self._finalizer: Optional[weakref.finalize] = None
+        # One instance may be shared by every Streamlit session (st.cache_resource): runs keep
+        # their state in a RunContext and each session thread keeps its own last_result
+        self._local = threading.local()
 
-    def _build_workflow(self):
+    @classmethod
+    def _build_workflow(cls) -> CompiledStateGraph:
+        # Nodes look the instance up from the run config, so the compiled graph holds no instance state
         graph = StateGraph(ResearchState)
-        graph.add_node("extract_tools", self._extract_tools_step)
-        graph.add_node("research", self._research_step)
-        graph.add_node("analyze", self._analyze_step)
+        graph.add_node(
+            "extract_tools",
+            _workflow_node("_extract_tools_step"),
+            cache_policy=CachePolicy(ttl=NODE_CACHE_TTL)
+        )
+        graph.add_node(
+            "research",
+            _workflow_node("_research_step"),
+            cache_policy=CachePolicy(key_func=cls._research_cache_key, ttl=NODE_CACHE_TTL)
+        )
+        graph.add_node(
+            "analyze",
+            _workflow_node("_analyze_step"),
+            cache_policy=CachePolicy(key_func=cls._analyze_cache_key, ttl=NODE_CACHE_TTL)
+        )
         graph.set_entry_point("extract_tools")
         graph.add_edge("extract_tools", "research")
         graph.add_edge("research", "analyze")
         graph.add_edge("analyze", END)
-        return graph.compile()
+        return graph.compile(cache=_build_node_cache())
+
+    @staticmethod
+    def _research_cache_key(state: ResearchState) -> str:
+        """Research only depends on the extracted tools (or the query when falling back to search)"""
+        if state.get("extracted_tools"):
+            return "tools:" + "\n".join(state["extracted_tools"])
+        # The fallback reads the article corpus before searching on the query
+        return "query:" + state["query"] + "\n" + state.get("scraped_corpus", "")
+
+    @staticmethod
+    def _analyze_cache_key(state: ResearchState) -> str:
+        """Key on the dumped data; pickling the models would also capture their fields-set bookkeeping"""
+        companies = [company.model_dump_json() for company in state.get("companies", [])]
+        return state["query"] + "\n" + "\n".join(companies)
+
+    @staticmethod
+    def _update_progress(run: RunContext, step: str, message: str, progress: int = None):
+        """Queue a progress update; the caller's thread applies it to the Streamlit UI"""
+        run.events.put(("progress", step, message, progress))
 
-    def _update_progress(self, step: str, message: str, progress: int = None):
-        """Update progress in Streamlit UI if callback is provided"""
-        if self.progress_callback:
-            if step in self.progress_callback:
+    @staticmethod
+    def _apply_progress(progress_callback: Optional[Dict], step: str, message: str, progress: int = None):
+        if progress_callback:
+            if step in progress_callback:
                 if step == 'progress_bar' and progress is not None:
-                    self.progress_callback[step].progress(progress)
+                    progress_callback[step].progress(progress)
                 else:
-                    self.progress_callback[step].info(message)
+                    progress_callback[step].info(message)
 
-    def _extract_tools_step(self, state: ResearchState) -> Dict[str, Any]:
-        self._update_progress('step1', f"🔍 Finding articles about: {state.query}")
-        print(f" Finding articles about: {state.query}")
+    async def _extract_tools_step(self, state: ResearchState, run: RunContext) -> Dict[str, Any]:
+        self._update_progress(run, 'step1', f"🔍 Finding articles about: {state['query']}")
+        print(f" Finding articles about: {state['query']}")
 
-        article_query = f"{state.query} tools comparison best alternatives"
-        search_results = self.firecrawl.search_companies(article_query, num_results=3)
+        article_query = f"{state['query']} tools comparison best alternatives"
+        # Search hits normally come back with their markdown already scraped
+        search_results = await self.firecrawl.asearch_companies(article_query, num_results=3, scrape=True)
+        search_failed = not search_results.success
+        articles = [result.get("markdown") or "" for result in search_results.data]
+        for result, markdown in zip(search_results.data, articles):
+            if markdown:
+                run.scrape_cache[normalize_url(result.get("url", ""))] = markdown
 
-        all_content = ""
-        for result in search_results.data:
-            url = result.get("url", "")
-            scraped = self.firecrawl.scrape_company_pages(url)
-            if scraped:
-                all_content += scraped.markdown[:1500] + "\n\n"
+        # Re-scrape only the hits whose inline scrape came back empty, all at once
+        missing = [i for i, markdown in enumerate(articles) if not markdown]
+        if missing:
+            scraped_list = await asyncio.gather(*[
+                self._scrape(run, search_results.data[i].get("url", ""))
+                for i in missing
+            ])
+            for i, markdown in zip(missing, scraped_list):
+                if markdown:
+                    articles[i] = markdown
+
+        all_content = "".join(
+            _compact_markdown(markdown, ARTICLE_CONTENT_CHARS) + "\n\n"
+            for markdown in articles
+            if markdown
+        )
 
         messages = [
-            SystemMessage(content=self.prompts.TOOL_EXTRACTION_SYSTEM),
-            HumanMessage(content=self.prompts.tool_extraction_user(state.query, all_content))
+            self._extract_sys,
+            HumanMessage(content=self.prompts.tool_extraction_user(state["query"], all_content))
         ]
 
         try:
-            response = self.llm.invoke(messages)
+            response = await self.llm.ainvoke(messages)
             tool_names = [
                 name.strip()
                 for name in response.content.strip().split("\n")
                 if name.strip()
             ]
             extracted_tools_text = ', '.join(tool_names[:5])
-            self._update_progress('step1', f"✅ Extracted tools: {extracted_tools_text}")
-            self._update_progress('progress_bar', None, 40)
+            self._update_progress(run, 'step1', f"✅ Extracted tools: {extracted_tools_text}")
+            self._update_progress(run, 'progress_bar', None, 40)
             
             print(f"Extracted tools: {extracted_tools_text}")
-            return {"extracted_tools": tool_names}
+            update = {"extracted_tools": tool_names, "scraped_corpus": all_content}
+            if search_failed:
+                update["failed_steps"] = ["extract_tools"]
+            return update
         except Exception as e:
-            self._update_progress('step1', f"❌ Error extracting tools: {str(e)}")
+            self._update_progress(run, 'step1', f"❌ Error extracting tools: {str(e)}")
             print(e)
-            return {"extracted_tools": []}
+            return {"extracted_tools": [], "scraped_corpus": all_content, "failed_steps": ["extract_tools"]}
 
-    def _analyze_company_content(self, company_name: str, content: str) -> CompanyAnalysis:
-        structured_llm = self.llm.with_structured_output(CompanyAnalysis)
+    @staticmethod
+    def _failed_analysis() -> CompanyAnalysis:
+        return CompanyAnalysis(
+            pricing_model="Unknown",
+            is_open_source=None,
+            tech_stack=[],
+            description="Failed",
+            api_available=None,
+            language_support=[],
+            integration_capabilities=[],
+        )
 
+    async def _analyze_company_batch(self, tools: List[Tuple[str, str]]) -> List[Optional[CompanyAnalysis]]:
+        """Analyze several (name, content) pairs with one structured LLM call; None where it failed"""
         messages = [
-            SystemMessage(content=self.prompts.TOOL_ANALYSIS_SYSTEM),
-            HumanMessage(content=self.prompts.tool_analysis_user(company_name, content))
+            self._analyze_sys,
+            HumanMessage(content=self.prompts.tool_analysis_batch_user(tools))
         ]
 
         try:
-            analysis = structured_llm.invoke(messages)
-            return analysis
+            response = await self._analysis_llm.ainvoke(messages)
         except Exception as e:
             print(e)
-            return CompanyAnalysis(
-                pricing_model="Unknown",
-                is_open_source=None,
-                tech_stack=[],
-                description="Failed",
-                api_available=None,
-                language_support=[],
-                integration_capabilities=[],
-            )
+            return [None] * len(tools)
+
+        by_name = {}
+        for analysis in response.analyses:
+            by_name.setdefault(analysis.name.strip().casefold(), analysis)
+        analyses = [by_name.pop(name.strip().casefold(), None) for name, _ in tools]
+        # Tools whose name the model altered take the unclaimed analyses in order;
+        # anything still missing stays None
+        unclaimed = iter(by_name.values())
+        return [analysis or next(unclaimed, None) for analysis in analyses]
+
+    async def _research_one_tool_async(self, tool_name: str) -> Optional[CompanyInfo]:
+        tool_search_results = await self.firecrawl.asearch_companies(tool_name + " official site", num_results=1)
+
+        if not tool_search_results.success:
+            raise RuntimeError(tool_search_results.error)
+        if not tool_search_results.data:
+            return None
+
+        result = tool_search_results.data[0]
+        return CompanyInfo(
+            name=tool_name,
+            # Search hits are not scraped here, so only the snippet is available
+            description=result.get("description", ""),
+            website=result.get("url", ""),
+            tech_stack=[],
+            competitors=[]
+        )
+
+    @staticmethod
+    def _apply_analysis(company: CompanyInfo, analysis: CompanyAnalysis) -> CompanyInfo:
+        company.pricing_model = analysis.pricing_model
+        company.is_open_source = analysis.is_open_source
+        company.tech_stack = analysis.tech_stack
+        company.description = analysis.description
+        company.api_available = analysis.api_available
+        company.language_support = analysis.language_support
+        company.integration_capabilities = analysis.integration_capabilities
+        return company
+
+    async def _scrape(self, run: RunContext, url: str) -> Optional[str]:
+        """Scrape one page, reusing anything already fetched during this run"""
+        key = normalize_url(url)
+        if key not in run.scrape_cache:
+            scraped = await self.firecrawl.ascrape_company_pages(url)
+            if not (scraped and scraped.markdown):
+                return None
+            run.scrape_cache[key] = scraped.markdown
+        return run.scrape_cache[key]
+
+    async def _batch_scrape(self, run: RunContext, urls: List[str]) -> List[Optional[str]]:
+        """Batch-scrape only the URLs not already fetched during this run"""
+        missing = [url for url in dict.fromkeys(urls) if normalize_url(url) not in run.scrape_cache]
+        if missing:
+            scraped_list = await self.firecrawl.abatch_scrape(missing)
+            for url, scraped in zip(missing, scraped_list):
+                if scraped and scraped.markdown:
+                    run.scrape_cache[normalize_url(url)] = scraped.markdown
+        return [run.scrape_cache.get(normalize_url(url)) for url in urls]
 
-    def _research_step(self, state: ResearchState) -> Dict[str, Any]:
-        extracted_tools = getattr(state, "extracted_tools", [])
+    async def _research_step(self, state: ResearchState, run: RunContext) -> Dict[str, Any]:
+        # Set when any part of this step falls back, so the result is not cached
+        failed = False
+        extracted_tools = state.get("extracted_tools", [])
+        if not extracted_tools:
+            # Reuse the step 1 articles before spending credits on another search
+            extracted_tools = _bold_tool_names(state.get("scraped_corpus", ""))
+            if extracted_tools:
+                print(" No extracted tools found, using tool names bolded in the articles")
 
         if not extracted_tools:
-            self._update_progress('step2', "⚠️ No extracted tools found, falling back to direct search")
+            self._update_progress(run, 'step2', "⚠️ No extracted tools found, falling back to direct search")
             print(" No extracted tools found, falling back to direct search")
-            search_results = self.firecrawl.search_companies(state.query, num_results=4)
-            tool_names = [
-                result.get("metadata", {}).get("title", "Unknown")
+            search_results = await self.firecrawl.asearch_companies(state["query"], num_results=4)
+            failed = failed or not search_results.success
+            # Unscraped hits carry the title at the top level, scraped ones in metadata
+            tool_names = _unique_names([
+                title
                 for result in search_results.data
-            ]
+                if (title := result.get("title") or (result.get("metadata") or {}).get("title"))
+            ])
         else:
-            tool_names = extracted_tools[:4]
+            # Analyses are matched back by case-insensitive name, so each name goes out once
+            tool_names = _unique_names(extracted_tools)[:4]
 
         tools_text = ', '.join(tool_names)
-        self._update_progress('step2', f"🔬 Researching specific tools: {tools_text}")
+        self._update_progress(run, 'step2', f"🔬 Researching specific tools: {tools_text}")
         print(f" Researching specific tools: {tools_text}")
 
+        # Every tool is independent network I/O, so fan the searches out at once
+        results = await asyncio.gather(
+            *[self._research_one_tool_async(tool_name) for tool_name in tool_names],
+            return_exceptions=True
+        )
+
         companies = []
-        total_tools = len(tool_names)
-        
-        for i, tool_name in enumerate(tool_names):
-            # Update progress for each tool
-            self._update_progress('step2', f"🔍 Analyzing {tool_name} ({i+1}/{total_tools})")
-            progress = 40 + (i * 30 // total_tools)
-            self._update_progress('progress_bar', None, progress)
-            
-            tool_search_results = self.firecrawl.search_companies(tool_name + " official site", num_results=1)
-
-            if tool_search_results.data:
-                result = tool_search_results.data[0]
-                url = result.get("url", "")
-
-                company = CompanyInfo(
-                    name=tool_name,
-                    description=result.get("markdown", ""),
-                    website=url,
-                    tech_stack=[],
-                    competitors=[]
-                )
-
-                scraped = self.firecrawl.scrape_company_pages(url)
-                if scraped:
-                    content = scraped.markdown
-                    analysis = self._analyze_company_content(company.name, content)
-
-                    company.pricing_model = analysis.pricing_model
-                    company.is_open_source = analysis.is_open_source
-                    company.tech_stack = analysis.tech_stack
-                    company.description = analysis.description
-                    company.api_available = analysis.api_available
-                    company.language_support = analysis.language_support
-                    company.integration_capabilities = analysis.integration_capabilities
-
-                companies.append(company)
-
-        self._update_progress('step2', f"✅ Research complete! Found {len(companies)} companies")
-        self._update_progress('progress_bar', None, 70)
+        for tool_name, result in zip(tool_names, results):
+            if isinstance(result, Exception):
+                failed = True
+                print(f"Failed to research {tool_name}: {result}")
+            elif result is not None:
+                companies.append(result)
+
+        # One batch job for all official sites instead of a scrape per tool
+        self._update_progress(run, 'step2', f"📄 Scraping {len(companies)} official sites...")
+        scraped_list = await self._batch_scrape(run, [company.website for company in companies])
+        to_analyze = [
+            (company, _compact_markdown(markdown, ANALYSIS_CONTENT_CHARS))
+            for company, markdown in zip(companies, scraped_list)
+            if markdown
+        ]
+        failed = failed or len(to_analyze) < len(companies)
+
+        total_tools = len(to_analyze)
+        completed = 0
+        progress_lock = asyncio.Lock()
+
+        async def analyze_batch(batch: List[Tuple[CompanyInfo, str]]):
+            nonlocal completed, failed
+            analyses = await self._analyze_company_batch(
+                [(company.name, content) for company, content in batch]
+            )
+            for (company, _), analysis in zip(batch, analyses):
+                if analysis is None:
+                    failed = True
+                    analysis = self._failed_analysis()
+                self._apply_analysis(company, analysis)
+            async with progress_lock:
+                completed += len(batch)
+                batch_names = ', '.join(company.name for company, _ in batch)
+                self._update_progress(run, 'step2', f"🔍 Analyzed {batch_names} ({completed}/{total_tools})")
+                self._update_progress(run, 'progress_bar', None, 40 + (completed * 30 // total_tools))
+
+        # Batches are independent LLM calls, so overlap their network waits
+        await asyncio.gather(*[
+            analyze_batch(to_analyze[start:start + ANALYSIS_BATCH_SIZE])
+            for start in range(0, total_tools, ANALYSIS_BATCH_SIZE)
+        ])
+
+        self._update_progress(run, 'step2', f"✅ Research complete! Found {len(companies)} companies")
+        self._update_progress(run, 'progress_bar', None, 70)
+        if failed:
+            return {"companies": companies, "failed_steps": ["research"]}
         return {"companies": companies}
 
-    def _analyze_step(self, state: ResearchState) -> Dict[str, Any]:
-        self._update_progress('step3', "🧠 Generating recommendations...")
+    async def _analyze_step(self, state: ResearchState, run: RunContext) -> Dict[str, Any]:
+        self._update_progress(run, 'step3', "🧠 Generating recommendations...")
         print("Generating recommendations")
 
-        company_data = ", ".join([
-            company.json() for company in state.companies
-        ])
+        # One compact JSON array; unset/default fields are dropped to save prompt tokens
+        company_data = json.dumps([
+            company.model_dump(exclude={"competitors"}, exclude_none=True, exclude_defaults=True)
+            for company in state.get("companies", [])
+        ], separators=(",", ":"))
 
         messages = [
-            SystemMessage(content=self.prompts.RECOMMENDATIONS_SYSTEM),
-            HumanMessage(content=self.prompts.recommendations_user(state.query, company_data))
+            self._recommend_sys,
+            HumanMessage(content=self.prompts.recommendations_user(state["query"], company_data))
         ]
 
-        response = self.llm.invoke(messages)
-        self._update_progress('step3', "✅ Recommendations generated successfully!")
-        self._update_progress('progress_bar', None, 90)
-        return {"analysis": response.content}
+        chunks = []
+        async for chunk in self.llm.astream(messages):
+            chunks.append(chunk.content)
+            run.events.put(("token", chunk.content))
+
+        self._update_progress(run, 'step3', "✅ Recommendations generated successfully!")
+        self._update_progress(run, 'progress_bar', None, 90)
+        return {"analysis": "".join(chunks)}
+
+    @property
+    def last_result(self) -> Optional[ResearchState]:
+        """Final state of the last run_streaming call consumed on the current thread"""
+        return getattr(self._local, "last_result", None)
 
     def run(self, query: str, progress_callback: Optional[Dict] = None) -> ResearchState:
         """Run the workflow with optional progress callback for Streamlit UI updates"""
-        self.progress_callback = progress_callback
-        initial_state = ResearchState(query=query)
-        final_state = self.workflow.invoke(initial_state)
-        return ResearchState(**final_state)
\ No newline at end of file
+        # Progress is replayed on this thread the same way as for a streaming run
+        for _ in self.run_streaming(query, progress_callback):
+            pass
+        return self.last_result
+
+    def run_streaming(self, query: str, progress_callback: Optional[Dict] = None) -> Iterator[str]:
+        """Yield recommendation tokens as they are generated, e.g. for st.write_stream.
+
+        The graph runs on the workflow's event loop while progress updates are replayed here, so
+        Streamlit elements are only touched from the script thread. The final state is
+        available as ``last_result`` once the generator is exhausted.
+        """
+        self._local.last_result = None
+        run = RunContext()
+        future = self._start_run(query, run)
+        future.add_done_callback(lambda _: run.events.put(None))
+        streamed = False
+        try:
+            while (event := run.events.get()) is not None:
+                kind, *payload = event
+                if kind == "token":
+                    streamed = True
+                    yield payload[0]
+                else:
+                    self._apply_progress(progress_callback, *payload)
+        finally:
+            # Let the run finish even if the consumer stopped early
+            concurrent.futures.wait([future])
+
+        # Re-raises anything the run failed with
+        result = self._local.last_result = future.result()
+        if not streamed and result.get("analysis"):
+            # The analyze node was served from cache, so nothing was streamed
+            yield result["analysis"]
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._loop_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=_run_loop, args=(self._loop,), name="workflow-loop", daemon=True).start()
+                # Also shut down when the instance is dropped without close(), e.g. on a Streamlit cache clear
+                self._finalizer = weakref.finalize(self, _shutdown_loop, self._loop, self.firecrawl)
+            return self._loop
+
+    def _start_run(self, query: str, run: RunContext):
+        """Schedule one graph run on the workflow's event loop and return its future"""
+        initial_state: ResearchState = {"query": query}
+        # All nodes are async, so the graph is driven by ainvoke; the final state is
+        # already a plain dict of validated values, so it is returned as-is
+        return asyncio.run_coroutine_threadsafe(
+            self.workflow.ainvoke(initial_state, config={"configurable": {"workflow": self, "run": run}}),
+            self._ensure_loop()
+        )
+
+    def close(self):
+        """Release the pooled Firecrawl connections and stop the event loop; a later run starts a new one"""
+        with self._loop_lock:
+            finalizer, self._loop, self._finalizer = self._finalizer, None, None
+        # A finalizer runs at most once, so this is a no-op if it already fired
+        if finalizer is not None and (future := finalizer()) is not None:
+            future.result()
+
+    def __enter__(self) -> "Workflow":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()